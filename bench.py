@@ -0,0 +1,246 @@
+"""Микробенчмарки горячих функций бота и слоя БД с контролем регрессий.
+
+Время каждого бенчмарка (медиана нескольких повторов, на один вызов)
+сравнивается с bench_baseline.json; если оно хуже базового больше чем на
+--threshold и при этом больше чем на --min-delta мкс, скрипт завершается
+с кодом 1.
+
+    python bench.py                        # все размеры БД: 1k, 100k, 1M
+    python bench.py --sizes 1000,100000    # без самой большой БД
+    python bench.py --update-baseline      # записать текущие результаты как базовые
+
+Синтетические БД строятся один раз и кэшируются в bench_data/; замеры
+идут на временной копии, так что кэш от прогона к прогону не меняется.
+Базовые значения зависят от машины: в новом окружении их нужно снять
+заново с --update-baseline и сравнивать только на той же машине.
+"""
+import argparse
+import gc
+import importlib.util
+import json
+import logging
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+BOT_SCRIPT = os.path.join(ROOT, "servicebotV0.4.py")
+BASELINE_FILE = os.path.join(ROOT, "bench_baseline.json")
+DATA_DIR = os.path.join(ROOT, "bench_data")
+DEFAULT_SIZES = "1000,100000,1000000"
+MIN_RUN_TIME = 0.2  # сек. на один повтор, по нему подбирается число вызовов
+REPEATS = 11
+SLOW_REPEATS = 3  # для бенчмарков, где один повтор дольше секунды
+# свои пороги для шумных бенчмарков: запись с commit упирается в fsync диска
+THRESHOLDS = {"add_booking_db": 0.5, "mark_cancelled_db": 0.5}
+
+NAMES = ["Иван Петров", "Мария Иванова", "Алексей Смирнов", "Ольга Кузнецова", "Дмитрий Попов", None]
+
+
+def load_bot_module():
+    spec = importlib.util.spec_from_file_location("servicebot", BOT_SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def measure(func: Callable[[], object]) -> float:
+    """Медиана времени одного вызова func по REPEATS повторам, в секундах.
+
+    Медиана, а не минимум: на общей машине случайные быстрые и медленные
+    прогоны одинаково часты, и медиана меньше зависит от них.
+    """
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        number = 1
+        while True:
+            started = time.perf_counter()
+            for _ in range(number):
+                func()
+            elapsed = time.perf_counter() - started
+            if elapsed >= MIN_RUN_TIME or number >= 1_000_000:
+                break
+            number *= 10 if elapsed < MIN_RUN_TIME / 10 else 2
+        times = [elapsed]
+        for _ in range((REPEATS if elapsed < 1 else SLOW_REPEATS) - 1):
+            started = time.perf_counter()
+            for _ in range(number):
+                func()
+            times.append(time.perf_counter() - started)
+    finally:
+        if gc_enabled:
+            gc.enable()
+    return statistics.median(times) / number
+
+
+def synthetic_phone(i: int) -> str:
+    return f"+7900{i:07d}"
+
+
+def build_synthetic_db(bot, size: int) -> str:
+    """Возвращает путь к БД с size записями, при необходимости создавая её."""
+    os.makedirs(DATA_DIR, exist_ok=True)
+    path = os.path.join(DATA_DIR, f"bookings_{size}.db")
+    if os.path.exists(path):
+        return path
+
+    tmp_path = path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    bot.DB_FILENAME = tmp_path
+    bot.init_db()
+    rnd = random.Random(size)
+    today = datetime(2026, 1, 1)
+    phones = max(size // 3, 1)
+
+    def rows():
+        for i in range(size):
+            visit = today + timedelta(days=rnd.randint(-365, 365))
+            created = visit - timedelta(days=rnd.randint(0, 30), minutes=rnd.randint(0, 1440))
+            services = rnd.sample(bot.SERVICES, rnd.randint(1, 3))
+            yield (
+                synthetic_phone(rnd.randrange(phones)),
+                rnd.choice(NAMES),
+                json.dumps(services, ensure_ascii=False),
+                visit.date().isoformat(),
+                created.isoformat(),
+                "cancelled" if rnd.random() < 0.1 else "active",
+            )
+
+    print(f"Создаю синтетическую БД на {size} записей...", file=sys.stderr)
+    bot.DB_CONN.executemany(
+        "INSERT INTO bookings (phone, name, services, date, created_at, status) VALUES (?, ?, ?, ?, ?, ?)",
+        rows(),
+    )
+    # один сегмент FTS — одинаковая раскладка индекса при любом числе перестроек
+    bot.DB_CONN.execute("INSERT INTO bookings_fts (bookings_fts) VALUES ('optimize')")
+    bot.DB_CONN.commit()
+    bot.DB_CONN.execute("VACUUM")
+    bot.DB_CONN.close()
+    os.replace(tmp_path, path)
+    return path
+
+
+def pure_benchmarks(bot) -> List[Tuple[str, Callable[[], object]]]:
+    now = datetime(2026, 1, 1, 12, 0)
+    dates = bot.get_available_dates(now)
+    preview = {"services": bot.SERVICES[:3], "name": "Иван Петров", "date": "02.01.26 Пт"}
+    return [
+        ("build_services_keyboard", lambda: bot.build_services_keyboard([0, 3, 5])),
+        ("build_dates_keyboard", lambda: bot.build_dates_keyboard(dates)),
+        ("get_available_dates", lambda: bot.get_available_dates(now)),
+        ("fmt_booking_preview", lambda: bot.fmt_booking_preview(preview)),
+        ("PHONE_RE.match[valid]", lambda: bot.PHONE_RE.match("+79661234567")),
+        ("PHONE_RE.match[invalid]", lambda: bot.PHONE_RE.match("+7 966 123-45-67")),
+    ]
+
+
+def db_benchmarks(bot, size: int) -> List[Tuple[str, Callable[[], object]]]:
+    """Запросы слоя БД; работают с временной копией, поэтому могут её менять."""
+    phone = synthetic_phone(1)
+    # запись для mark_cancelled_db: её обновление каждый раз срабатывает триггерами сводки
+    cancel_id = bot.add_booking_db(phone, "Иван Петров", bot.SERVICES[:2], "2026-01-02")
+    # курсор страницы из середины истории, как у кнопки «Далее» после многих страниц
+    middle_id = bot.DB_CONN.execute("SELECT MAX(id) / 2 FROM bookings").fetchone()[0]
+    return [
+        ("get_bookings_by_phone_db", lambda: bot.get_bookings_by_phone_db(phone)),
+        ("get_bookings_for_date_db", lambda: bot.get_bookings_for_date_db("2026-01-02")),
+        ("count_bookings_by_date_range_db", lambda: bot.count_bookings_by_date_range_db("2026-01-01", "2026-01-31")),
+        ("get_all_db_bookings", bot.get_all_db_bookings),
+        ("search_bookings_db", lambda: bot.search_bookings_db("Иван ABS", bot.FIND_RANK_WINDOW)),
+        ("search_bookings_db(deep)", lambda: bot.search_bookings_db("Иван ABS", bot.FIND_RANK_WINDOW, middle_id)),
+        ("build_find_page", lambda: bot.build_find_page({"query": "Иван ABS", "cursors": []}, 0, bot.FTS_NO_BOUND, 0)),
+        ("service_report_db", lambda: bot.service_report_db("week", bot.REPORT_PERIODS["week"])),
+        ("service_totals_db", lambda: bot.service_totals_db()),
+        ("load_bookings_to_memory", bot.load_bookings_to_memory),
+        ("mark_cancelled_db", lambda: bot.mark_cancelled_db(cancel_id)),
+        # последним: добавленные записи меняют размер БД для остальных замеров
+        ("add_booking_db", lambda: bot.add_booking_db(phone, "Иван Петров", bot.SERVICES[:2], "2026-01-02")),
+    ]
+
+
+def run(bot, sizes: List[int]) -> Dict[str, float]:
+    results = {}
+    for name, func in pure_benchmarks(bot):
+        results[name] = measure(func)
+        print(f"{name:<48}{results[name] * 1e6:>14.2f} мкс")
+
+    for size in sizes:
+        path = build_synthetic_db(bot, size)
+        with tempfile.TemporaryDirectory(dir=DATA_DIR) as tmp:
+            bot.DB_FILENAME = os.path.join(tmp, os.path.basename(path))
+            shutil.copyfile(path, bot.DB_FILENAME)
+            bot.init_db()
+            try:
+                for name, func in db_benchmarks(bot, size):
+                    key = f"{name}[{size}]"
+                    results[key] = measure(func)
+                    print(f"{key:<48}{results[key] * 1e6:>14.2f} мкс")
+            finally:
+                bot.DB_CONN.close()
+                bot.BOOKINGS.clear()
+    return results
+
+
+def compare(results: Dict[str, float], baseline: Dict[str, float], threshold: float, min_delta: float) -> List[str]:
+    regressions = []
+    print(f"\n{'Бенчмарк':<48}{'база, мкс':>14}{'сейчас, мкс':>14}{'изменение':>12}")
+    for name, current in results.items():
+        base = baseline.get(name)
+        if base is None:
+            print(f"{name:<48}{'—':>14}{current * 1e6:>14.2f}{'новый':>12}")
+            continue
+        change = current / base - 1
+        # у субмикросекундных замеров шум в разы больше их самих — нужен и абсолютный порог
+        limit = max(threshold, THRESHOLDS.get(name.split("[")[0], 0))
+        regressed = change > limit and current - base > min_delta
+        mark = " !" if regressed else ""
+        print(f"{name:<48}{base * 1e6:>14.2f}{current * 1e6:>14.2f}{change:>+11.0%}{mark}")
+        if regressed:
+            regressions.append(name)
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Микробенчмарки бота с контролем регрессий.")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help=f"размеры синтетических БД через запятую (по умолчанию {DEFAULT_SIZES})")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="допустимое замедление относительно базы, доля (по умолчанию 0.25 = 25%%)")
+    parser.add_argument("--min-delta", type=float, default=1.0,
+                        help="замедление меньше стольких мкс на вызов регрессией не считается (по умолчанию 1.0)")
+    parser.add_argument("--update-baseline", action="store_true", help="записать результаты в bench_baseline.json")
+    args = parser.parse_args()
+
+    bot = load_bot_module()
+    logging.getLogger().setLevel(logging.WARNING)
+    results = run(bot, [int(s) for s in args.sizes.split(",") if s.strip()])
+
+    baseline = {}
+    if os.path.exists(BASELINE_FILE):
+        with open(BASELINE_FILE, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    if args.update_baseline:
+        baseline.update(results)
+        with open(BASELINE_FILE, "w", encoding="utf-8") as f:
+            json.dump(dict(sorted(baseline.items())), f, indent=2, ensure_ascii=False)
+            f.write("\n")
+        print(f"\nБазовые значения записаны в {BASELINE_FILE}")
+        return
+
+    regressions = compare(results, baseline, args.threshold, args.min_delta / 1e6)
+    if regressions:
+        print(f"\nРегрессии больше {args.threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+    print("\nРегрессий нет.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""Прогон записанного трафика через обработчики бота без обращения к Telegram.
+
+Трафик пишет сам бот при CAPTURE_UPDATES = True (файл CAPTURE_FILENAME).
+Обновления проходят через те же обработчики, что регистрирует main(),
+а вызовы Bot API отвечает фейковый сервер. Записи идут во временную БД.
+
+    python replay.py traffic.jsonl              # как можно быстрее
+    python replay.py traffic.jsonl --speed 1    # в реальном темпе
+    python replay.py traffic.jsonl --speed 10 --db bookings.db
+"""
+import argparse
+import asyncio
+import importlib.util
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from collections import Counter, defaultdict
+from typing import Any, Dict, List
+
+from telegram import Update
+from telegram.ext import ApplicationBuilder, BaseHandler, ConversationHandler
+from telegram.request import BaseRequest, RequestData
+
+BOT_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "servicebotV0.4.py")
+# методы, в ответ на которые Telegram присылает сообщение
+MESSAGE_METHODS = {"sendMessage", "sendPhoto", "editMessageText", "editMessageReplyMarkup", "editMessageCaption"}
+
+
+def load_bot_module():
+    spec = importlib.util.spec_from_file_location("servicebot", BOT_SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class FakeBotApi(BaseRequest):
+    """Отвечает на вызовы Bot API правдоподобными данными и считает их."""
+
+    def __init__(self):
+        self.calls: Counter = Counter()
+        self._message_id = 0
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    async def do_request(self, url: str, method: str, request_data: RequestData = None, *args, **kwargs):
+        endpoint = url.rsplit("/", 1)[-1]
+        self.calls[endpoint] += 1
+        params = request_data.parameters if request_data else {}
+        return 200, json.dumps({"ok": True, "result": self._result(endpoint, params)}).encode()
+
+    def _result(self, endpoint: str, params: Dict[str, Any]) -> Any:
+        if endpoint == "getMe":
+            return {"id": 1, "is_bot": True, "first_name": "Replay", "username": "replay_bot"}
+        if endpoint in MESSAGE_METHODS:
+            self._message_id += 1
+            return {
+                "message_id": params.get("message_id", self._message_id),
+                "date": int(time.time()),
+                "chat": {"id": params.get("chat_id", 0), "type": "private"},
+                "text": params.get("text", ""),
+            }
+        return True
+
+
+def instrument(handler: BaseHandler, timings: Dict[str, List[float]]) -> None:
+    """Оборачивает callback обработчика (и вложенных в ConversationHandler) замером времени."""
+    if isinstance(handler, ConversationHandler):
+        nested = list(handler.entry_points) + list(handler.fallbacks)
+        for state_handlers in handler.states.values():
+            nested.extend(state_handlers)
+        for h in nested:
+            instrument(h, timings)
+        return
+
+    callback = handler.callback
+    name = callback.__name__
+
+    async def timed(update, context):
+        started = time.perf_counter()
+        try:
+            return await callback(update, context)
+        finally:
+            timings[name].append(time.perf_counter() - started)
+
+    handler.callback = timed
+
+
+def percentile(values: List[float], p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, round(p / 100 * (len(ordered) - 1)))]
+
+
+def read_records(path: str) -> List[Dict[str, Any]]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+async def replay(bot, records: List[Dict[str, Any]], speed: float) -> None:
+    api = FakeBotApi()
+    app = (
+        ApplicationBuilder()
+        .token("0:replay")
+        .request(api)
+        .get_updates_request(FakeBotApi())
+        .updater(None)
+        .build()
+    )
+    bot.register_handlers(app)
+    timings: Dict[str, List[float]] = defaultdict(list)
+    for group in app.handlers.values():
+        for handler in group:
+            instrument(handler, timings)
+
+    update_times = []
+    async with app:
+        api.calls.clear()  # getMe при инициализации не считаем
+        started = time.perf_counter()
+        first_ts = records[0]["ts"] if records else 0
+        for record in records:
+            if speed > 0:
+                delay = (record["ts"] - first_ts) / speed - (time.perf_counter() - started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            update = Update.de_json(record["update"], app.bot)
+            t0 = time.perf_counter()
+            await app.process_update(update)
+            update_times.append(time.perf_counter() - t0)
+        elapsed = time.perf_counter() - started
+
+    print(f"Обновлений: {len(records)} за {elapsed:.2f} сек. ({len(records) / elapsed if elapsed else 0:.1f} в сек.)")
+    rows = [("обновление целиком", update_times)] + sorted(timings.items())
+    print(f"\n{'Обработчик':<32}{'вызовов':>8}{'p50, мс':>10}{'p95, мс':>10}{'p99, мс':>10}")
+    for name, values in rows:
+        if not values:
+            continue
+        p50, p95, p99 = (percentile(values, p) * 1000 for p in (50, 95, 99))
+        print(f"{name:<32}{len(values):>8}{p50:>10.2f}{p95:>10.2f}{p99:>10.2f}")
+    print(f"\nВызовов Bot API: {sum(api.calls.values())}")
+    for endpoint, count in api.calls.most_common():
+        print(f"  {endpoint}: {count}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Прогон записанного трафика через обработчики бота.")
+    parser.add_argument("traffic", help="JSONL-файл, записанный ботом при CAPTURE_UPDATES = True")
+    parser.add_argument("--speed", type=float, default=0,
+                        help="множитель темпа: 1 — как в записи, N — в N раз быстрее, 0 — без пауз (по умолчанию)")
+    parser.add_argument("--db", help="БД, копия которой используется как начальное состояние (по умолчанию пустая)")
+    args = parser.parse_args()
+
+    bot = load_bot_module()
+    logging.getLogger().setLevel(logging.WARNING)
+    with tempfile.TemporaryDirectory() as tmp:
+        # всё, что бот пишет на диск, — только во временный каталог
+        bot.DB_FILENAME = os.path.join(tmp, "replay.db")
+        bot.BACKUP_DIR = os.path.join(tmp, "backups")
+        bot.CAPTURE_UPDATES = False
+        bot.CAPTURE_FILENAME = os.path.join(tmp, "traffic.jsonl")
+        if args.db:
+            shutil.copyfile(args.db, bot.DB_FILENAME)
+        bot.init_db()
+        bot.load_bookings_to_memory()
+        try:
+            asyncio.run(replay(bot, read_records(args.traffic), args.speed))
+        finally:
+            bot.DB_CONN.close()
+
+
+if __name__ == "__main__":
+    main()
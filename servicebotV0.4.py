@@ -1,8 +1,11 @@
 import re
+import asyncio
+import hashlib
 import logging
 import sqlite3
 import json
 import os
+import time
 from datetime import datetime, timedelta
 from typing import Dict, List, Any, Tuple
 
@@ -12,6 +15,7 @@ from telegram import (
     Update,
 )
 from telegram.ext import (
+    Application,
     ApplicationBuilder,
     CommandHandler,
     ContextTypes,
@@ -19,6 +23,7 @@ from telegram.ext import (
     MessageHandler,
     filters,
     ConversationHandler,
+    TypeHandler,
 )
 
 # ----------------- Настройки -----------------
@@ -27,6 +32,22 @@ ADMIN_CODE = "9435"
 DB_FILENAME = "bookings.db"
 ENABLE_NAME = True
 MAX_DAYS_AHEAD = 30
+FIND_PAGE_SIZE = 10
+FIND_RANK_WINDOW = 100  # по релевантности сортируются пачки из стольких свежих совпадений
+FTS_NO_BOUND = 2 ** 63 - 1
+FIND_SEARCHES_KEEP = 20  # сколько последних сообщений /find в чате можно листать
+# резервные копии bookings.db
+BACKUP_DIR = "backups"
+BACKUP_KEEP = 7
+BACKUP_INTERVAL_HOURS = 24
+BACKUP_PAGES_PER_STEP = 64
+BACKUP_STEP_PAUSE = 0.005  # сек. между шагами, чтобы не задерживать запись в БД
+# запись входящего трафика для replay.py (телефоны в записи заменяются)
+CAPTURE_UPDATES = False
+CAPTURE_FILENAME = "traffic.jsonl"
+# сколько последних периодов показывает /report для day / week / month
+REPORT_PERIODS = {"day": 14, "week": 8, "month": 6}
+TELEGRAM_MESSAGE_LIMIT = 4096
 
 SERVICES = [
     "Панель приборов (Cluster)",
@@ -42,6 +63,16 @@ SERVICES = [
 ]
 
 PHONE_RE = re.compile(r'^\+?\d{7,15}$')
+# номер в свободном тексте: 7–15 цифр подряд или группами 3-3-2-2
+# с необязательным кодом страны: +7 (966) 123-45-67, 8 966 123 45 67
+PHONE_IN_TEXT_RE = re.compile(
+    r'(?<![\w+])(?:'
+    r'\+?\d{7,15}'
+    r'|(?:\+?\d{1,3}[\s\-]?)?\(?\d{3}\)?[\s\-]?\d{3}[\s\-]?\d{2}[\s\-]?\d{2}'
+    r')(?!\w)'
+)
+# команда и её первый аргумент (админский код) при записи трафика не меняются
+COMMAND_HEAD_RE = re.compile(r'/\S+(?:\s+\S+)?')
 WEEKDAY_RU = ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс"]
 SERVICE_ADDRESS = "г. Москва, Алтуфьевское шоссе, 31с1, въезд через 31с5\nСервис «ExactLab»."
 
@@ -52,6 +83,7 @@ logger = logging.getLogger(__name__)
 
 BOOKINGS: Dict[str, List[Dict[str, Any]]] = {}
 DB_CONN: sqlite3.Connection = None
+BACKUP_LOCK = asyncio.Lock()
 
 
 def init_db():
@@ -78,6 +110,144 @@ def init_db():
         cur.execute("ALTER TABLE bookings ADD COLUMN status TEXT DEFAULT 'active'")
         DB_CONN.commit()
 
+    init_search_index(cur)
+    init_service_rollups(cur)
+    DB_CONN.commit()
+
+
+# Телефон индексируется целиком и хвостами из 4, 7 и 10 цифр, чтобы префиксный
+# запрос по FTS находил номер и по последним цифрам.
+_FTS_PHONE_SQL = " || ' ' || ".join(
+    ["{row}.phone"] + [f"substr({{row}}.phone, -{n})" for n in (4, 7, 10)]
+)
+_FTS_SERVICES_SQL = "(SELECT group_concat(value, ' ') FROM json_each({row}.services))"
+_FTS_VALUES_SQL = "{row}.id, {row}.name, " + _FTS_PHONE_SQL + ", " + _FTS_SERVICES_SQL
+
+
+def init_search_index(cur: sqlite3.Cursor) -> None:
+    """FTS5-индекс по имени, телефону и услугам, синхронизируемый триггерами.
+
+    Индекс contentless (content=''): сами тексты берутся из bookings, поэтому
+    при удалении триггер передаёт в 'delete' те же значения, что индексировались.
+    """
+    cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'bookings_fts'")
+    exists = cur.fetchone() is not None
+    cur.execute(
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS bookings_fts USING fts5(
+            name, phone, services,
+            content = '',
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '2 3 4'
+        )
+        """
+    )
+    new_values = _FTS_VALUES_SQL.format(row="new")
+    old_values = _FTS_VALUES_SQL.format(row="old")
+    cur.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS bookings_fts_ai AFTER INSERT ON bookings BEGIN
+            INSERT INTO bookings_fts (rowid, name, phone, services) VALUES ({new_values});
+        END
+        """
+    )
+    cur.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS bookings_fts_ad AFTER DELETE ON bookings BEGIN
+            INSERT INTO bookings_fts (bookings_fts, rowid, name, phone, services) VALUES ('delete', {old_values});
+        END
+        """
+    )
+    cur.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS bookings_fts_au AFTER UPDATE OF name, phone, services ON bookings BEGIN
+            INSERT INTO bookings_fts (bookings_fts, rowid, name, phone, services) VALUES ('delete', {old_values});
+            INSERT INTO bookings_fts (rowid, name, phone, services) VALUES ({new_values});
+        END
+        """
+    )
+    if not exists:
+        # первая инициализация — индексируем уже накопленные записи
+        cur.execute(
+            f"INSERT INTO bookings_fts (rowid, name, phone, services) "
+            f"SELECT {_FTS_VALUES_SQL.format(row='b')} FROM bookings AS b"
+        )
+
+
+# Вклад записи в сводку: по строке на каждую услугу, дата — дата визита,
+# lead_days — сколько дней от создания записи до визита.
+_ROLLUP_ADD_SQL = """
+    INSERT INTO service_daily_stats (service, day, booked, cancelled, lead_days_sum)
+    SELECT value, {row}.date, 1,
+           IFNULL({row}.status, 'active') = 'cancelled',
+           CAST(julianday({row}.date) - julianday(date({row}.created_at)) AS INTEGER)
+    FROM json_each({row}.services) WHERE 1
+    ON CONFLICT (service, day) DO UPDATE SET
+        booked = booked + 1,
+        cancelled = cancelled + excluded.cancelled,
+        lead_days_sum = lead_days_sum + excluded.lead_days_sum;
+"""
+_ROLLUP_SUB_SQL = """
+    UPDATE service_daily_stats SET
+        booked = booked - 1,
+        cancelled = cancelled - (IFNULL(old.status, 'active') = 'cancelled'),
+        lead_days_sum = lead_days_sum - CAST(julianday(old.date) - julianday(date(old.created_at)) AS INTEGER)
+    WHERE day = old.date AND service IN (SELECT value FROM json_each(old.services));
+"""
+
+
+def init_service_rollups(cur: sqlite3.Cursor) -> None:
+    """Сводка услуга × день для /report, обновляемая триггерами на bookings."""
+    cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'service_daily_stats'")
+    exists = cur.fetchone() is not None
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS service_daily_stats (
+            service TEXT NOT NULL,
+            day TEXT NOT NULL,
+            booked INTEGER NOT NULL DEFAULT 0,
+            cancelled INTEGER NOT NULL DEFAULT 0,
+            lead_days_sum INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (service, day)
+        )
+        """
+    )
+    cur.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS service_stats_ai AFTER INSERT ON bookings BEGIN
+            {_ROLLUP_ADD_SQL.format(row="new")}
+        END
+        """
+    )
+    cur.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS service_stats_ad AFTER DELETE ON bookings BEGIN
+            {_ROLLUP_SUB_SQL}
+        END
+        """
+    )
+    cur.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS service_stats_au
+        AFTER UPDATE OF services, date, created_at, status ON bookings BEGIN
+            {_ROLLUP_SUB_SQL}
+            {_ROLLUP_ADD_SQL.format(row="new")}
+        END
+        """
+    )
+    if not exists:
+        # первая инициализация — собираем сводку по уже накопленным записям
+        cur.execute(
+            """
+            INSERT INTO service_daily_stats (service, day, booked, cancelled, lead_days_sum)
+            SELECT j.value, b.date, COUNT(*),
+                   SUM(IFNULL(b.status, 'active') = 'cancelled'),
+                   SUM(CAST(julianday(b.date) - julianday(date(b.created_at)) AS INTEGER))
+            FROM bookings AS b, json_each(b.services) AS j
+            GROUP BY j.value, b.date
+            """
+        )
+
 
 def add_booking_db(phone: str, name: str, services: List[str], date_iso: str) -> int:
     cur = DB_CONN.cursor()
@@ -134,6 +304,70 @@ def count_bookings_by_date_range_db(start_iso: str, end_iso: str) -> Dict[str, i
     return {row[0]: row[1] for row in cur.fetchall()}
 
 
+_REPORT_PERIOD_FMT = {"day": "%Y-%m-%d", "week": "%Y-W%W", "month": "%Y-%m"}
+
+
+def service_report_db(period: str, periods: int) -> List[Tuple]:
+    """(период, услуга, записей, отмен, сумма дней до визита) за последние periods периодов."""
+    fmt = _REPORT_PERIOD_FMT[period]
+    cur = DB_CONN.cursor()
+    cur.execute(
+        """
+        SELECT strftime(:fmt, day) AS period, service,
+               SUM(booked), SUM(cancelled), SUM(lead_days_sum)
+        FROM service_daily_stats
+        WHERE strftime(:fmt, day) IN (
+            SELECT DISTINCT strftime(:fmt, day) FROM service_daily_stats
+            WHERE booked > 0 ORDER BY 1 DESC LIMIT :periods
+        )
+        GROUP BY period, service
+        HAVING SUM(booked) > 0
+        ORDER BY period DESC, SUM(booked) DESC
+        """,
+        {"fmt": fmt, "periods": periods},
+    )
+    return cur.fetchall()
+
+
+def service_totals_db() -> List[Tuple]:
+    cur = DB_CONN.cursor()
+    cur.execute(
+        "SELECT service, SUM(booked), SUM(cancelled), SUM(lead_days_sum) FROM service_daily_stats "
+        "GROUP BY service HAVING SUM(booked) > 0 ORDER BY SUM(booked) DESC"
+    )
+    return cur.fetchall()
+
+
+def build_fts_query(text: str) -> str:
+    # каждое слово — префиксный терм, все термы должны совпасть (AND)
+    terms = re.findall(r"\w+", text)
+    return " ".join(f'"{t}"*' for t in terms)
+
+
+def search_bookings_db(query: str, limit: int, before: int = FTS_NO_BOUND) -> List[Tuple]:
+    """limit самых свежих совпадений с id < before, упорядоченных по релевантности.
+
+    bm25 считается только для этих limit строк, поэтому время не зависит от
+    того, сколько всего записей подходит под запрос.
+    """
+    fts_query = build_fts_query(query)
+    if not fts_query:
+        return []
+    cur = DB_CONN.cursor()
+    cur.execute(
+        """
+        SELECT b.id, b.phone, b.name, b.services, b.date, b.created_at, IFNULL(b.status,'active')
+        FROM (
+            SELECT rowid, bm25(bookings_fts, 10.0, 5.0, 1.0) AS score FROM bookings_fts
+            WHERE bookings_fts MATCH ? AND rowid < ? ORDER BY rowid DESC LIMIT ?
+        ) AS m JOIN bookings AS b ON b.id = m.rowid
+        ORDER BY m.score, b.id DESC
+        """,
+        (fts_query, before, limit),
+    )
+    return cur.fetchall()
+
+
 def load_bookings_to_memory():
     BOOKINGS.clear()
     rows = get_all_db_bookings()
@@ -145,6 +379,130 @@ def load_bookings_to_memory():
         })
 
 
+# ----------------- Резервное копирование -----------------
+
+
+def _backup_progress(status: int, remaining: int, total: int) -> None:
+    # пауза между шагами отпускает БД для основных запросов бота
+    time.sleep(BACKUP_STEP_PAUSE)
+
+
+def backup_db_to(dest_path: str) -> None:
+    """Онлайн-копия DB_CONN в dest_path порциями по BACKUP_PAGES_PER_STEP страниц с проверкой целостности.
+
+    Копия пишется во временный файл и появляется под именем dest_path только
+    после успешного integrity_check, так что rotate_backups не видит битых копий.
+    """
+    tmp_path = dest_path + ".tmp"
+    try:
+        dest = sqlite3.connect(tmp_path)
+        try:
+            DB_CONN.backup(dest, pages=BACKUP_PAGES_PER_STEP, progress=_backup_progress)
+            result = dest.execute("PRAGMA integrity_check").fetchone()[0]
+        finally:
+            dest.close()
+        if result != "ok":
+            raise sqlite3.DatabaseError(f"Резервная копия {dest_path} не прошла integrity_check: {result}")
+        os.replace(tmp_path, dest_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def rotate_backups() -> None:
+    names = sorted(n for n in os.listdir(BACKUP_DIR) if n.startswith("bookings-") and n.endswith(".db"))
+    for name in names[:-BACKUP_KEEP]:
+        os.remove(os.path.join(BACKUP_DIR, name))
+        logger.info(f"Удалена старая резервная копия {name}")
+
+
+def remove_stale_backup_tmp() -> None:
+    # .tmp остаётся, если процесс убили посреди копирования; под BACKUP_LOCK
+    # других копирований нет, так что все такие файлы — брошенные
+    for name in os.listdir(BACKUP_DIR):
+        if name.startswith("bookings-") and name.endswith(".db.tmp"):
+            os.remove(os.path.join(BACKUP_DIR, name))
+            logger.info(f"Удалён незавершённый файл резервной копии {name}")
+
+
+async def run_backup() -> Tuple[str, int, float]:
+    """Делает резервную копию в отдельном потоке; возвращает (путь, размер в байтах, длительность в сек.)."""
+    async with BACKUP_LOCK:
+        os.makedirs(BACKUP_DIR, exist_ok=True)
+        remove_stale_backup_tmp()
+        path = os.path.join(BACKUP_DIR, f"bookings-{datetime.now().strftime('%Y%m%d-%H%M%S')}.db")
+        started = time.monotonic()
+        await asyncio.to_thread(backup_db_to, path)
+        duration = time.monotonic() - started
+        rotate_backups()
+    size = os.path.getsize(path)
+    logger.info(f"Резервная копия {path} создана: {size} байт за {duration:.2f} сек.")
+    return path, size, duration
+
+
+async def backup_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    try:
+        await run_backup()
+    except Exception:
+        logger.exception("Ошибка резервного копирования")
+
+
+# ----------------- Запись трафика -----------------
+
+# соль на время работы процесса: один и тот же номер в пределах записи
+# заменяется одинаково, но по записи исходный номер не подобрать
+_REDACT_SALT = os.urandom(16)
+
+
+_CAPTURE_FILE = None
+
+
+def _fake_phone(raw: str) -> str:
+    # цифры заменяются, разделители остаются: формат номера сохраняется
+    digits = re.sub(r"\D", "", raw)
+    digest = hashlib.sha256(_REDACT_SALT + digits.encode()).hexdigest()
+    fake = iter("".join(str(int(c, 16) % 10) for c in digest))
+    return re.sub(r"\d", lambda _: next(fake), raw)
+
+
+def redact_phones(obj: Any, key: str = None) -> Any:
+    """Заменяет номера телефонов в строках на фиктивные того же формата.
+
+    callback_data (ключ data) формирует сам бот, телефонов там нет — её не
+    трогаем. У команды не меняются имя и первый аргумент, иначе при прогоне
+    /find <код> 1234567 получил бы чужой код. phone_number контакта
+    заменяется всегда, в каком бы виде он ни пришёл.
+    """
+    if isinstance(obj, str):
+        if key == "phone_number":
+            return _fake_phone(obj)
+        if key == "data":
+            return obj
+        head = COMMAND_HEAD_RE.match(obj)
+        head = head.group(0) if head else ""
+        return head + PHONE_IN_TEXT_RE.sub(lambda m: _fake_phone(m.group(0)), obj[len(head):])
+    if isinstance(obj, dict):
+        return {k: redact_phones(v, k) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [redact_phones(v, key) for v in obj]
+    return obj
+
+
+def _write_capture(line: str) -> None:
+    global _CAPTURE_FILE
+    if _CAPTURE_FILE is None:
+        _CAPTURE_FILE = open(CAPTURE_FILENAME, "a", encoding="utf-8")
+    _CAPTURE_FILE.write(line)
+    _CAPTURE_FILE.flush()
+
+
+async def capture_update(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    record = {"ts": time.time(), "update": redact_phones(update.to_dict())}
+    # запись в файл — в отдельном потоке, чтобы не задерживать event loop
+    await asyncio.to_thread(_write_capture, json.dumps(record, ensure_ascii=False) + "\n")
+
+
 (
     SELECT_SERVICE,
     PHONE,
@@ -680,6 +1038,176 @@ async def stats_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
 
+def split_message(lines: List[str], limit: int = TELEGRAM_MESSAGE_LIMIT) -> List[str]:
+    """Склеивает строки в сообщения не длиннее limit символов, разрывая только между строками."""
+    chunks = []
+    current = ""
+    for line in lines:
+        candidate = f"{current}\n{line}" if current else line
+        if len(candidate) <= limit:
+            current = candidate
+            continue
+        if current:
+            chunks.append(current)
+        line = line.lstrip("\n")
+        while len(line) > limit:
+            chunks.append(line[:limit])
+            line = line[limit:]
+        current = line
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def fmt_service_stats(service: str, booked: int, cancelled: int, lead_sum: int) -> str:
+    return (
+        f"{service} — {booked} "
+        f"(отмен {cancelled * 100 / booked:.0f}%, ср. срок записи {lead_sum / booked:.1f} дн.)"
+    )
+
+
+async def report_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    args = context.args
+    if not args or args[0] != ADMIN_CODE:
+        await update.message.reply_text("Эта команда доступна только администратору. Введите: /report <код> [day|week|month]")
+        return
+    period = args[1] if len(args) > 1 else "week"
+    if period not in REPORT_PERIODS:
+        await update.message.reply_text("Период может быть day, week или month. Пример: /report <код> month")
+        return
+
+    totals = service_totals_db()
+    if not totals:
+        await update.message.reply_text("Записей пока нет.")
+        return
+
+    titles = {"day": "по дням", "week": "по неделям", "month": "по месяцам"}
+    text_lines = [f"Спрос на услуги {titles[period]} (последние {REPORT_PERIODS[period]}, по дате визита):"]
+    current = None
+    for period_key, service, booked, cancelled, lead_sum in service_report_db(period, REPORT_PERIODS[period]):
+        if period_key != current:
+            current = period_key
+            text_lines.append(f"\n{period_key}")
+        text_lines.append("  " + fmt_service_stats(service, booked, cancelled, lead_sum))
+
+    text_lines.append("\nИтого за всё время:")
+    for service, booked, cancelled, lead_sum in totals:
+        text_lines.append("  " + fmt_service_stats(service, booked, cancelled, lead_sum))
+    for chunk in split_message(text_lines):
+        await update.message.reply_text(chunk)
+
+
+async def backup_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    args = context.args
+    if not args or args[0] != ADMIN_CODE:
+        await update.message.reply_text("Эта команда доступна только администратору. Введите: /backup <код>")
+        return
+    await update.message.reply_text("Создаю резервную копию...")
+    try:
+        path, size, duration = await run_backup()
+    except Exception as e:
+        logger.exception("Ошибка резервного копирования")
+        await update.message.reply_text(f"Не удалось создать резервную копию: {e}")
+        return
+    await update.message.reply_text(
+        f"✅ Резервная копия создана и проверена:\n{path}\n"
+        f"Размер: {size / 1024:.1f} КБ, время: {duration:.2f} сек."
+    )
+
+
+def build_find_page(search: Dict[str, Any], page: int, before: int, skip: int) -> Tuple[str, InlineKeyboardMarkup]:
+    """Страница поиска: пачка свежих совпадений с id < before, отсортированная по релевантности, с позиции skip."""
+    query = search["query"]
+    window = search_bookings_db(query, FIND_RANK_WINDOW, before)
+    rows = window[skip:skip + FIND_PAGE_SIZE]
+    if not rows:
+        text = f"По запросу «{query}» ничего не найдено." if page == 0 else "Больше результатов нет."
+        return text, InlineKeyboardMarkup([[InlineKeyboardButton("❌ Закрыть", callback_data="find_close")]])
+
+    # курсоры показанных страниц нужны для кнопки «Назад»
+    del search["cursors"][page:]
+    search["cursors"].append((before, skip))
+    if skip + FIND_PAGE_SIZE < len(window):
+        next_cursor = (before, skip + FIND_PAGE_SIZE)
+    elif len(window) == FIND_RANK_WINDOW:
+        oldest = min(r[0] for r in window)
+        next_cursor = (oldest, 0) if search_bookings_db(query, 1, oldest) else None
+    else:
+        next_cursor = None
+
+    text_lines = [
+        f"Результаты поиска «{query}» (стр. {page + 1}; свежие первыми, "
+        f"релевантность внутри каждых {FIND_RANK_WINDOW} совпадений):\n"
+    ]
+    for r in rows:
+        bid, phone, name, services_json, date_iso, created_at, status = r
+        services = ", ".join(json.loads(services_json))
+        dt = datetime.fromisoformat(date_iso).date()
+        mark = " [отменена]" if status == "cancelled" else ""
+        text_lines.append(f"ID:{bid} {phone} {name or '—'} — {make_date_label(dt)} — {services}{mark}")
+
+    nav = []
+    if page > 0:
+        prev_before, prev_skip = search["cursors"][page - 1]
+        nav.append(InlineKeyboardButton("◀️ Назад", callback_data=f"find_page|{page - 1}|{prev_before}|{prev_skip}|{ADMIN_CODE}"))
+    if next_cursor:
+        nav.append(InlineKeyboardButton("Далее ▶️", callback_data=f"find_page|{page + 1}|{next_cursor[0]}|{next_cursor[1]}|{ADMIN_CODE}"))
+    kb = [nav] if nav else []
+    kb.append([InlineKeyboardButton("❌ Закрыть", callback_data="find_close")])
+    return "\n".join(text_lines), InlineKeyboardMarkup(kb)
+
+
+async def find_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    args = context.args
+    if not args or args[0] != ADMIN_CODE:
+        await update.message.reply_text("Эта команда доступна только администратору. Введите: /find <код> <запрос>")
+        return
+    query = " ".join(args[1:]).strip()
+    if not build_fts_query(query):
+        await update.message.reply_text(
+            "Укажите запрос: часть имени, последние цифры телефона или название услуги.\n"
+            f"Результаты идут от свежих записей к старым, по релевантности сортируются внутри каждых {FIND_RANK_WINDOW} совпадений.\n"
+            "Пример: /find <код> Иван"
+        )
+        return
+    search = {"query": query, "cursors": []}
+    text, kb = build_find_page(search, 0, FTS_NO_BOUND, 0)
+    msg = await update.message.reply_text(text, reply_markup=kb)
+    # запрос хранится по id сообщения с результатами: в callback_data (64 байта)
+    # он может не поместиться, а у каждого сообщения поиска он свой
+    searches = context.chat_data.setdefault('find_searches', {})
+    searches[msg.message_id] = search
+    while len(searches) > FIND_SEARCHES_KEEP:
+        searches.pop(next(iter(searches)))
+
+
+async def find_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    q = update.callback_query
+    await q.answer()
+    data = q.data
+    if data == "find_close":
+        context.chat_data.get('find_searches', {}).pop(q.message.message_id, None)
+        await q.edit_message_text("Закрыто.")
+        return
+    if data.startswith("find_page|"):
+        try:
+            _, page_str, before_str, skip_str, code = data.split("|", 4)
+            page, before, skip = int(page_str), int(before_str), int(skip_str)
+        except Exception:
+            await q.edit_message_text("Неправильный формат запроса.")
+            return
+        if code != ADMIN_CODE:
+            await q.edit_message_text("Неверный админский код.")
+            return
+        search = context.chat_data.get('find_searches', {}).get(q.message.message_id)
+        if not search:
+            await q.edit_message_text("Поиск устарел. Повторите команду /find <код> <запрос>.")
+            return
+        text, kb = build_find_page(search, page, before, skip)
+        await q.edit_message_text(text, reply_markup=kb)
+        return
+
+
 async def delete_booking_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     q = update.callback_query
     await q.answer()
@@ -715,13 +1243,7 @@ async def delete_booking_callback(update: Update, context: ContextTypes.DEFAULT_
         return
 
 
-def main() -> None:
-    # инициализация БД и памяти
-    init_db()
-    load_bookings_to_memory()
-
-    app = ApplicationBuilder().token(BOT_TOKEN).build()
-
+def register_handlers(app: Application) -> None:
     # ConversationHandler с обработкой отмены внутри
     conv_handler = ConversationHandler(
         entry_points=[CommandHandler('start', cmd_start)],
@@ -756,9 +1278,30 @@ def main() -> None:
     # admin handlers
     app.add_handler(CommandHandler('bookings', show_bookings_cmd))
     app.add_handler(CommandHandler('stats', stats_cmd))
+    app.add_handler(CommandHandler('find', find_cmd))
+    app.add_handler(CommandHandler('report', report_cmd))
+    app.add_handler(CommandHandler('backup', backup_cmd))
     app.add_handler(CallbackQueryHandler(stats_callback, pattern=r'^(stats_date\||stats_back\||stats_close)'))
+    app.add_handler(CallbackQueryHandler(find_callback, pattern=r'^(find_page\||find_close)'))
     app.add_handler(CallbackQueryHandler(delete_booking_callback, pattern=r'^(del\||start_again|end_session)'))
 
+
+def main() -> None:
+    # инициализация БД и памяти
+    init_db()
+    load_bookings_to_memory()
+
+    app = ApplicationBuilder().token(BOT_TOKEN).build()
+    register_handlers(app)
+    if CAPTURE_UPDATES:
+        # группа -1 выполняется до остальных обработчиков и не мешает им
+        app.add_handler(TypeHandler(Update, capture_update), group=-1)
+        logger.info(f"Входящие обновления записываются в {CAPTURE_FILENAME}")
+
+    app.job_queue.run_repeating(
+        backup_job, interval=timedelta(hours=BACKUP_INTERVAL_HOURS), first=timedelta(minutes=1), name="db_backup"
+    )
+
     logger.info("Бот запущен и готов к работе")
     app.run_polling()
 
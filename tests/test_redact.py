@@ -0,0 +1,63 @@
+import importlib.util
+import os
+
+import pytest
+
+BOT_SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "servicebotV0.4.py")
+
+
+@pytest.fixture(scope="module")
+def bot():
+    spec = importlib.util.spec_from_file_location("servicebot", BOT_SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.mark.parametrize("text", [
+    "/find {code} 4567",
+    "/find {code} Иван",
+    "/report {code} week",
+    "/backup {code}",
+    "2026-10-20",
+    "дата 2026-10-20 в 10:30",
+])
+def test_commands_and_dates_unchanged(bot, text):
+    text = text.format(code=bot.ADMIN_CODE)
+    assert bot.redact_phones(text) == text
+
+
+def test_admin_code_kept_with_numeric_query(bot):
+    redacted = bot.redact_phones(f"/find {bot.ADMIN_CODE} 1234567")
+    assert redacted.startswith(f"/find {bot.ADMIN_CODE} ")
+    assert not redacted.endswith("1234567")
+
+
+@pytest.mark.parametrize("text", [
+    "+79661234567",
+    "+7 966 123-45-67",
+    "+7-966-123-45-67",
+    "+7 (966) 123 45 67",
+    "8(966)1234567",
+    "966 123 45 67",
+])
+def test_phone_formats_redacted(bot, text):
+    redacted = bot.redact_phones(f"мой номер {text}")
+    assert text not in redacted
+    # формат сохраняется: отличаются только цифры
+    assert [c for c in redacted if not c.isdigit()] == [c for c in f"мой номер {text}" if not c.isdigit()]
+
+
+def test_contact_phone_always_redacted_and_callback_data_kept(bot):
+    update = {
+        "message": {"contact": {"phone_number": "+7 (966) 123 45 67"}},
+        "callback_query": {"data": "date|2026-10-20"},
+    }
+    redacted = bot.redact_phones(update)
+    assert redacted["message"]["contact"]["phone_number"] != "+7 (966) 123 45 67"
+    assert redacted["callback_query"]["data"] == "date|2026-10-20"
+
+
+def test_same_number_same_fake(bot):
+    assert bot.redact_phones("+79661234567") == bot.redact_phones("+79661234567")
+    assert bot.PHONE_RE.match(bot.redact_phones("+79661234567"))